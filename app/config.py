@@ -8,13 +8,33 @@ class Settings:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     ACTIAN_DB_ADDRESS: str = os.getenv("ACTIAN_DB_ADDRESS", "100.117.162.36:50051")
     COLLECTION_NAME: str = os.getenv("COLLECTION_NAME", "recipes")
+    MAX_DB_CONNS: int = int(os.getenv("MAX_DB_CONNS", "4"))
     GEMINI_MODEL: str = "gemini-2.5-flash-lite"
     USE_AGENT: bool = os.getenv("USE_AGENT", "false").lower() == "true"
+    AGENT_VERBOSE: bool = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
     RELAXED_MATCHING: bool = os.getenv("RELAXED_MATCHING", "true").lower() == "true"
+    # Largest /api/scan request body accepted (image + preferences), in bytes
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
 
     # Local embedding model (sentence-transformers, runs on CPU/GPU)
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "all-mpnet-base-v2")
     EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "768"))
+    # "torch" (default), "onnx" or "openvino"; the last two need
+    # `pip install sentence-transformers[onnx]` / `[openvino]`.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    # ONNX file inside the model repo, e.g. "onnx/model_qint8_avx512_vnni.onnx"
+    # for the int8 dynamically quantized export. Empty uses the FP32 model.onnx.
+    EMBEDDING_ONNX_FILE: str = os.getenv("EMBEDDING_ONNX_FILE", "")
+
+    # Whole-scan response cache (keyed on image bytes + preferences) and the
+    # search results cache (keyed on ingredient set + preferences); TTL 0 disables
+    SCAN_CACHE_TTL: int = int(os.getenv("SCAN_CACHE_TTL", "3600"))
+    SCAN_CACHE_SIZE: int = int(os.getenv("SCAN_CACHE_SIZE", "256"))
+
+    # Gemini Vision result cache (keyed on exact image bytes); TTL 0 disables
+    VISION_CACHE_TTL: int = int(os.getenv("VISION_CACHE_TTL", "86400"))
+    VISION_CACHE_SIZE: int = int(os.getenv("VISION_CACHE_SIZE", "1024"))
 
 
 settings = Settings()
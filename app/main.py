@@ -10,22 +10,61 @@ Usage:
     uvicorn app.main:app --reload --port 8000
 """
 
-import json
+import asyncio
 import time
 import logging
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
 
-from app.models import UserPreferences, ScanResponse, RecipeResult
-from app.services.agent import run_agent
+from app.config import settings
+from app.models import UserPreferences, ScanResponse
+from app.services import cache, gemini, vector_db
+from app.services.agent import results_cache_info, run_agent_async
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=settings.LOG_LEVEL, handlers=[logging.StreamHandler()])
+
+# Repeat uploads of the same photo + preferences (retries, "try again")
+_scan_cache = cache.TTLCache(maxsize=settings.SCAN_CACHE_SIZE, ttl=settings.SCAN_CACHE_TTL)
+
+
+async def _warm_embedder():
+    try:
+        await asyncio.to_thread(gemini.warmup_embedder)
+    except Exception as e:
+        logger.warning(f"Could not warm up the embedding model at startup: {e}")
+
+
+async def _connect_vector_db():
+    # If the DB is down, requests still reconnect lazily (or fall back to
+    # Gemini generation).
+    try:
+        await asyncio.to_thread(vector_db.open_pool)
+    except Exception as e:
+        logger.warning(f"Could not connect to Actian VectorAI DB at startup: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and open the Actian connection pool
+    # concurrently so the first scan doesn't pay either cold-start cost.
+    await asyncio.gather(_warm_embedder(), _connect_vector_db())
+    yield
+    await gemini.close_batcher()
+    await asyncio.to_thread(vector_db.close_pool)
+
 
 app = FastAPI(
     title="Treat Your-shelf API",
     description="Snap a photo of your pantry, get personalized recipe recommendations.",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # CORS — allow all origins during development so Tailscale / ngrok / etc. work.
@@ -44,23 +83,142 @@ async def root():
     return {"message": "Treat Your-shelf API is running", "docs": "/docs"}
 
 
+@app.get("/debug/embedding_cache")
+async def embedding_cache():
+    return gemini.embedding_cache_info()
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
-
-
-# NOTE: This is intentionally a regular `def` (not `async def`) so that
-# FastAPI automatically runs it in a thread-pool.  The Gemini SDK calls
-# inside run_agent() are synchronous and would block the event loop if
-# this were declared as `async def`.
-@app.post("/api/scan", response_model=ScanResponse)
-def scan_pantry(
-    image: UploadFile = File(..., description="Photo of pantry or fridge"),
-    preferences: str = Form(
-        default="{}",
-        description="JSON string of user preferences (dietary_restrictions, cuisine_preferences, etc.)",
-    ),
-):
+    return {
+        "status": "ok",
+        "embedding_cache": gemini.embedding_cache_info(),
+        "vision_cache": gemini.vision_cache_info(),
+        "scan_cache": _scan_cache.info(),
+        "results_cache": results_cache_info(),
+    }
+
+
+async def _read_multipart_form(request: Request) -> dict[str, tuple[str | None, bytearray]]:
+    """Stream a multipart/form-data body into ``{field: (content_type, data)}``.
+
+    Chunks are fed to the parser straight from ``request.stream()`` so the
+    upload is never spooled to a temp file or buffered twice. Bodies over
+    settings.MAX_UPLOAD_BYTES are rejected with 413, malformed or truncated
+    ones with 400.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds {settings.MAX_UPLOAD_BYTES} bytes",
+    )
+    try:
+        declared_length = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if declared_length > settings.MAX_UPLOAD_BYTES:
+        raise too_large
+
+    fields: dict[str, tuple[str | None, bytearray]] = {}
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    part = {"data": bytearray()}
+    finished = []
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("latin-1")
+        part_type = headers.get(b"content-type")
+        part["data"] = bytearray()
+        fields[name] = (part_type.decode("latin-1") if part_type else None, part["data"])
+
+    def on_part_data(data, start, end):
+        part["data"].extend(data[start:end])
+
+    def on_end():
+        finished.append(True)
+
+    parser = MultipartParser(
+        boundary,
+        callbacks={
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_end": on_end,
+        },
+    )
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # Content-Length may be absent (chunked) or wrong, so count as we go
+            received += len(chunk)
+            if received > settings.MAX_UPLOAD_BYTES:
+                raise too_large
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+    if not finished:
+        # The parser accepts a body cut off before the closing boundary
+        raise HTTPException(status_code=400, detail="Incomplete multipart body")
+    return fields
+
+
+# The form is parsed by hand (see _read_multipart_form), so describe it for /docs.
+_SCAN_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["image"],
+                    "properties": {
+                        "image": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Photo of pantry or fridge",
+                        },
+                        "preferences": {
+                            "type": "string",
+                            "default": "{}",
+                            "description": "JSON string of user preferences (dietary_restrictions, cuisine_preferences, etc.)",
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+# The handler is `async def` so concurrency is not capped by the thread-pool
+# size; run_agent_async() awaits Gemini natively and only pushes the blocking
+# embedding / Actian calls onto worker threads.
+@app.post("/api/scan", response_model=ScanResponse, openapi_extra=_SCAN_OPENAPI)
+async def scan_pantry(request: Request):
     """Scan a pantry/fridge image and return personalized recipe recommendations.
 
     The image is sent as multipart/form-data along with a JSON string of preferences.
@@ -85,51 +243,58 @@ def scan_pantry(
     const data = await res.json();
     ```
     """
+    form = await _read_multipart_form(request)
+
     # Validate image
-    if not image.content_type or not image.content_type.startswith("image/"):
+    image_type, image_bytes = form.get("image", (None, bytearray()))
+    if not image_type or not image_type.startswith("image/"):
         raise HTTPException(
             status_code=400,
-            detail=f"File must be an image. Got: {image.content_type}",
+            detail=f"File must be an image. Got: {image_type}",
         )
-
-    # Read image bytes
-    image_bytes = image.file.read()
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Empty image file")
 
     # Parse preferences JSON
+    _, raw_preferences = form.get("preferences", (None, bytearray()))
     try:
-        prefs_dict = json.loads(preferences)
-        user_prefs = UserPreferences(**prefs_dict)
-    except (json.JSONDecodeError, ValueError) as e:
+        user_prefs = UserPreferences.model_validate_json(raw_preferences or b"{}")
+    except ValidationError as e:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid preferences JSON: {e}",
         )
 
+    # Serve a cached response if this exact photo was scanned with these preferences
+    cache_key = f"scan:{cache.content_digest(image_bytes)}:{cache.preferences_digest(user_prefs)}"
+    cached = _scan_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Scan cache hit")
+        return cached
+
     # Run the agent pipeline
     try:
         start = time.time()
         logger.info("Starting recipe pipeline…")
-        result = run_agent(image_bytes, user_prefs)
+        # Hand the parsed buffer through without copying it into a new bytes object
+        result = await run_agent_async(memoryview(image_bytes), user_prefs)
         elapsed = time.time() - start
         logger.info(f"Pipeline finished in {elapsed:.1f}s")
     except Exception as e:
-        import traceback
-        tb_str = traceback.format_exc()
-        logger.error(f"Pipeline failed:\n{tb_str}")
+        logger.exception("Pipeline failed")
         raise HTTPException(
             status_code=500,
-            detail=f"Recipe search failed: {e}\nTraceback:\n{tb_str}",
+            detail=f"Recipe search failed: {e}",
         )
 
-    # Build response
-    recipes = [
-        RecipeResult(**r) if isinstance(r, dict) else r
-        for r in result.get("recipes", [])
-    ]
-
-    return ScanResponse(
-        detected_ingredients=result.get("detected_ingredients", []),
-        recipes=recipes,
+    # Build response (validated in one pass by pydantic-core)
+    response = ScanResponse.model_validate(
+        {
+            "detected_ingredients": result.get("detected_ingredients", []),
+            "recipes": result.get("recipes", []),
+        }
     )
+    # Empty results may come from a transient failure, so don't pin them
+    if response.recipes:
+        _scan_cache.set(cache_key, response)
+    return response
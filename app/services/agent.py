@@ -10,87 +10,237 @@ Two modes:
 The direct pipeline is recommended for free-tier Gemini keys (5 RPM limit on 2.5-flash).
 """
 
-import json
+import asyncio
+import contextvars
+import functools
 import time
 import logging
+import re
+import numpy as np
+import orjson
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
 
 from app.config import settings
-from app.models import UserPreferences, RecipeResult
-from app.services import gemini, vector_db
+from app.models import DetectedIngredient, UserPreferences, RecipeResult
+from app.services import cache, gemini, vector_db
 
 logger = logging.getLogger(__name__)
 
 
-# ── Shared state for the current request (used by agent tools) ──
-_current_image_bytes: bytes = b""
-_current_preferences: UserPreferences = UserPreferences()
+# ── Per-request state (used by agent tools) ──
+# ContextVars keep concurrent scans from seeing each other's image or
+# preferences, whether they run on worker threads or as asyncio tasks.
+_image_ctx: contextvars.ContextVar[bytes | memoryview] = contextvars.ContextVar(
+    "image", default=b""
+)
+_prefs_ctx: contextvars.ContextVar[UserPreferences] = contextvars.ContextVar("prefs")
 
 
 # ── Helpers ──
 
 
+# (tag, payload flag) pairs, in the order tags are shown in the app
+_TAG_FLAGS = [(tag, f"tag_{tag}") for tag in vector_db.KNOWN_DIETARY_TAGS]
+
+
+def _dietary_tags(payload: dict) -> list[str]:
+    """Tag names for a recipe, rebuilt from its boolean tag_* payload flags."""
+    tags = payload.get("dietary_tags")
+    if tags is not None:
+        # Recipes ingested before the list was dropped from the payload
+        return tags
+    return [tag for tag, flag in _TAG_FLAGS if payload.get(flag)]
+
+
+def _payload_list(payload: dict, key: str) -> list[str]:
+    """A list field from a recipe payload (ingredients / directions)."""
+    value = payload.get(key, [])
+    if isinstance(value, str):
+        # Recipes ingested before lists were stored natively
+        try:
+            value = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            value = [value]
+    return value
+
+
 def _format_results(
     results: list[dict],
     ingredient_names: list[str],
 ) -> list[dict]:
     """Convert raw Actian search results into the frontend RecipeResult format."""
+    # Lowercase the detected names once, not once per recipe
+    detected_lower = [i.lower() for i in ingredient_names]
+
     recipes = []
-    for r in results:
+    match_pcts = np.empty(len(results), dtype=np.float64)
+    scores = np.empty(len(results), dtype=np.float64)
+    for idx, r in enumerate(results):
         payload = r.get("payload", {})
-        score = r.get("score", 0)
-
-        # Parse ingredients from payload
-        raw_ingredients = payload.get("ingredients", [])
-        if isinstance(raw_ingredients, str):
-            try:
-                raw_ingredients = json.loads(raw_ingredients)
-            except json.JSONDecodeError:
-                raw_ingredients = [raw_ingredients]
-
-        # Calculate pantry match percentage
-        recipe_ing_lower = [i.lower() for i in raw_ingredients]
-        detected_lower = [i.lower() for i in ingredient_names]
-        matches = sum(
-            1 for d in detected_lower if any(d in ri for ri in recipe_ing_lower)
-        )
-        total_recipe_ings = max(len(raw_ingredients), 1)
-        match_pct = min(int((matches / total_recipe_ings) * 100), 100)
+        scores[idx] = r.get("score", 0)
 
-        # Blend: 40% ingredient overlap + 60% vector similarity
-        vector_match = int(score * 100)
-        blended_match = int(0.4 * match_pct + 0.6 * vector_match)
-        blended_match = min(max(blended_match, 0), 100)
+        raw_ingredients = _payload_list(payload, "ingredients")
 
-        # Parse directions
-        raw_directions = payload.get("directions", [])
-        if isinstance(raw_directions, str):
-            try:
-                raw_directions = json.loads(raw_directions)
-            except json.JSONDecodeError:
-                raw_directions = [raw_directions]
+        # Calculate pantry match percentage: a detected ingredient counts if it
+        # is a substring of any recipe ingredient. Joining on a newline (never
+        # part of a name) gives one C-level scan per detected ingredient.
+        recipe_joined = "\n".join(raw_ingredients).lower()
+        matches = sum(1 for d in detected_lower if d in recipe_joined)
+        total_recipe_ings = max(len(raw_ingredients), 1)
+        match_pcts[idx] = min(int((matches / total_recipe_ings) * 100), 100)
 
         recipes.append(
             {
                 "id": r.get("id", 0),
                 "title": payload.get("title", "Unknown Recipe"),
-                "match": blended_match,
                 "ingredients": raw_ingredients,
                 "description": payload.get("description", ""),
-                "directions": raw_directions,
+                "directions": _payload_list(payload, "directions"),
                 "category": payload.get("category", ""),
-                "dietary_tags": payload.get("dietary_tags", []),
+                "dietary_tags": _dietary_tags(payload),
                 "skill_level": payload.get("skill_level", ""),
             }
         )
 
-    recipes.sort(key=lambda x: x["match"], reverse=True)
+    # Blend: 40% ingredient overlap + 60% vector similarity, truncated like
+    # int() at each step and clamped to 0-100, for all hits at once
+    vector_match = np.trunc(scores * 100)
+    blended = np.clip(np.trunc(0.4 * match_pcts + 0.6 * vector_match), 0, 100).astype(int)
+
+    # Stable descending order, same tie-breaking as list.sort(reverse=True)
+    ranked = []
+    for idx in np.argsort(-blended, kind="stable"):
+        recipe = recipes[idx]
+        recipe["match"] = int(blended[idx])
+        ranked.append(recipe)
+    return ranked
+
+
+# Plural endings to strip when comparing names: "tomatoes"/"tomato",
+# "berries"/"berry", "eggs"/"egg" (but not "hummus" or "grass").
+_PLURAL_RE = re.compile(r"ies$|(?<=o)es$|(?<![su])s$")
+
+
+def _ingredient_key(name: str) -> str:
+    name = name.lower().strip()
+    return _PLURAL_RE.sub(lambda m: "y" if m.group() == "ies" else "", name)
+
+
+def _dedupe_ingredients(ingredients: list[DetectedIngredient]) -> list[DetectedIngredient]:
+    """Drop detections that only differ by case or plural form, keeping the first."""
+    seen = set()
+    unique = []
+    for ing in ingredients:
+        key = _ingredient_key(ing.name)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(ing)
+    return unique
+
+
+def _normalized(values: list[str]) -> list[str]:
+    """Lowercase, dedupe and sort values so equivalent requests share a query."""
+    return sorted({v.lower().strip() for v in values})
+
+
+def _build_query_text(
+    ingredient_names: list[str],
+    preferences: UserPreferences,
+) -> str:
+    """Build a rich query string for embedding from ingredients + preferences."""
+    query_parts = [f"Recipe with: {', '.join(_normalized(ingredient_names))}"]
+    if preferences.cuisine_preferences:
+        query_parts.append(f"Cuisine: {', '.join(_normalized(preferences.cuisine_preferences))}")
+    if preferences.meal_type:
+        query_parts.append(f"Meal type: {preferences.meal_type.lower().strip()}")
+    if preferences.dietary_restrictions:
+        query_parts.append(f"Dietary: {', '.join(_normalized(preferences.dietary_restrictions))}")
+    if preferences.additional_prompt:
+        query_parts.append(preferences.additional_prompt.strip())
+    return ". ".join(query_parts)
+
+
+# Number of recipes requested from Actian and returned to the app
+_TOP_K = 10
+
+
+def _search_vector_db(
+    query_vector: np.ndarray,
+    preferences: UserPreferences,
+    top_k: int = _TOP_K,
+) -> list[dict]:
+    """Search Actian with preference filters, retrying unfiltered on no hits."""
+    diet_filter = vector_db.build_recipe_filter(
+        dietary_restrictions=preferences.dietary_restrictions or None,
+        skill_level=preferences.skill_level,
+    )
+
+    with vector_db.borrow_client() as client:
+        raw_results = vector_db.search_recipes(
+            client, query_vector, top_k=top_k, filter_obj=diet_filter,
+        )
+        if not raw_results:
+            logger.warning("Vector DB returned no results, trying without filters…")
+            raw_results = vector_db.search_recipes(client, query_vector, top_k=top_k)
+
+    logger.info(f"Vector DB returned {len(raw_results)} results")
+    return raw_results
+
+
+# Different photos often boil down to the same ingredient set; with the same
+# preferences the search result is identical, so reuse it.
+_results_cache = cache.TTLCache(maxsize=settings.SCAN_CACHE_SIZE, ttl=settings.SCAN_CACHE_TTL)
+
+
+def _results_cache_key(ingredient_names: list[str], preferences: UserPreferences) -> str:
+    return f"{'|'.join(_normalized(ingredient_names))}:{cache.preferences_digest(preferences)}"
+
+
+def _cached_results(key: str) -> list[dict] | None:
+    cached = _results_cache.get(key)
+    if cached is not None:
+        logger.info("Search results cache hit")
+        return list(cached)
+    return None
+
+
+def results_cache_info() -> dict:
+    """Hit/miss statistics for the ingredient-set search results cache."""
+    return _results_cache.info()
+
+
+def _rank_and_cache(
+    cache_key: str,
+    ingredient_names: list[str],
+    preferences: UserPreferences,
+    query_vector: np.ndarray,
+) -> list[dict]:
+    """Search Actian, format hits for the frontend and cache non-empty results."""
+    raw_results = _search_vector_db(query_vector, preferences)
+    recipes = _format_results(raw_results, ingredient_names)
+    if recipes:
+        _results_cache.set(cache_key, tuple(recipes))
     return recipes
 
 
+def _fallback_recipes(
+    ingredient_names: list[str],
+    preferences: UserPreferences,
+    error: Exception,
+) -> list[dict]:
+    """Generate recipes with Gemini after a failed vector DB search (not cached)."""
+    logger.error(f"Vector DB search failed: {error}", exc_info=error)
+    logger.info("Falling back to Gemini LLM recipe generation…")
+    try:
+        return gemini.generate_recipes(ingredient_names, preferences)
+    except Exception as e:
+        logger.error(f"Gemini fallback also failed: {e}", exc_info=True)
+        return []
+
+
 def _search_with_preferences(
     ingredient_names: list[str],
     preferences: UserPreferences,
@@ -99,79 +249,60 @@ def _search_with_preferences(
 
     Steps:
       1. Build a query string from ingredients + preferences
-      2. Embed the query using the local sentence-transformers model (no API call)
-      3. Search Actian VectorAI DB for similar recipe vectors
+      2. Embed it with the local sentence-transformers model (no API call)
+      3. Search Actian VectorAI DB
       4. Format results for the frontend
 
     Falls back to Gemini LLM generation if the vector DB is unreachable.
+    DB results are cached per (ingredient set, preferences); fallback and
+    empty results are not.
     """
-    # Build a rich query string for embedding
-    query_parts = [f"Recipe with: {', '.join(ingredient_names)}"]
-    if preferences.cuisine_preferences:
-        query_parts.append(f"Cuisine: {', '.join(preferences.cuisine_preferences)}")
-    if preferences.meal_type:
-        query_parts.append(f"Meal type: {preferences.meal_type}")
-    if preferences.dietary_restrictions:
-        query_parts.append(f"Dietary: {', '.join(preferences.dietary_restrictions)}")
-    if preferences.additional_prompt:
-        query_parts.append(preferences.additional_prompt)
-    query_text = ". ".join(query_parts)
+    cache_key = _results_cache_key(ingredient_names, preferences)
+    cached = _cached_results(cache_key)
+    if cached is not None:
+        return cached
 
+    query_text = _build_query_text(ingredient_names, preferences)
     logger.info(f"Searching vector DB with query: {query_text[:100]}…")
 
     try:
-        # Step 1: Generate embedding locally (instant, no API call)
         query_vector = gemini.generate_embedding(query_text)
+        return _rank_and_cache(cache_key, ingredient_names, preferences, query_vector)
+    except Exception as e:
+        return _fallback_recipes(ingredient_names, preferences, e)
 
-        # Step 2: Build optional filters from preferences
-        diet_filter = vector_db.build_recipe_filter(
-            dietary_restrictions=preferences.dietary_restrictions or None,
-            skill_level=preferences.skill_level,
-        )
-
-        # Step 3: Search Actian VectorAI DB
-        client = vector_db.get_client()
-        client.connect()
-        try:
-            raw_results = vector_db.search_recipes(
-                client, query_vector, top_k=10, filter_obj=diet_filter,
-            )
-        finally:
-            client.close()
 
-        if not raw_results:
-            logger.warning("Vector DB returned no results, trying without filters…")
-            client = vector_db.get_client()
-            client.connect()
-            try:
-                raw_results = vector_db.search_recipes(
-                    client, query_vector, top_k=10,
-                )
-            finally:
-                client.close()
+async def _search_with_preferences_async(
+    ingredient_names: list[str],
+    preferences: UserPreferences,
+) -> list[dict]:
+    """Async variant of _search_with_preferences().
 
-        logger.info(f"Vector DB returned {len(raw_results)} results")
+    The query goes through the shared embedding micro-batcher; the DB search
+    and any Gemini fallback run on a worker thread.
+    """
+    cache_key = _results_cache_key(ingredient_names, preferences)
+    cached = _cached_results(cache_key)
+    if cached is not None:
+        return cached
 
-        # Step 4: Format for frontend
-        return _format_results(raw_results, ingredient_names)
+    query_text = _build_query_text(ingredient_names, preferences)
+    logger.info(f"Searching vector DB with query: {query_text[:100]}…")
 
+    try:
+        (query_vector,) = await gemini.embed_queries_async([query_text])
+        return await asyncio.to_thread(
+            _rank_and_cache, cache_key, ingredient_names, preferences, query_vector,
+        )
     except Exception as e:
-        logger.error(f"Vector DB search failed: {e}", exc_info=True)
-        logger.info("Falling back to Gemini LLM recipe generation…")
-        # Fallback: generate recipes directly via Gemini
-        try:
-            recipes = gemini.generate_recipes(ingredient_names, preferences)
-            return recipes
-        except Exception as e2:
-            logger.error(f"Gemini fallback also failed: {e2}", exc_info=True)
-            return []
+        return await asyncio.to_thread(_fallback_recipes, ingredient_names, preferences, e)
 
 
 # ── Direct Pipeline (default) ──
 
 
 def run_direct_pipeline(
-    image_bytes: bytes,
+    image_bytes: bytes | memoryview,
     preferences: UserPreferences,
 ) -> dict:
     """Run the direct pipeline: image → ingredients → vector DB search.
@@ -182,7 +313,7 @@ def run_direct_pipeline(
     # Step 1: Analyze image (1 Gemini API call)
     logger.info("Analyzing image with Gemini Vision...")
     inventory = gemini.analyze_image(image_bytes)
-    ingredient_names = [ing.name for ing in inventory.ingredients]
+    ingredient_names = [ing.name for ing in _dedupe_ingredients(inventory.ingredients)]
     logger.info(f"Detected {len(ingredient_names)} ingredients: {ingredient_names}")
 
     if not ingredient_names:
@@ -199,29 +330,79 @@ def run_direct_pipeline(
     }
 
 
+async def _prepare_search_backends() -> None:
+    """Load the embedder and open the DB pool; both are no-ops once warm.
+
+    Failures are only logged: the search step retries the connect and falls
+    back to Gemini generation, and must not cancel the vision call.
+    """
+    results = await asyncio.gather(
+        asyncio.to_thread(gemini.load_embedder),
+        asyncio.to_thread(vector_db.open_pool),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Search backend warmup failed: {result}")
+
+
+async def run_direct_pipeline_async(
+    image_bytes: bytes | memoryview,
+    preferences: UserPreferences,
+) -> dict:
+    """Async variant of run_direct_pipeline() for the FastAPI event loop.
+
+    The embedding model load and the Actian connect don't depend on the
+    vision result, so they run while Gemini is looking at the image.
+    """
+    logger.info("Analyzing image with Gemini Vision...")
+    inventory, _ = await asyncio.gather(
+        gemini.analyze_image_async(image_bytes),
+        _prepare_search_backends(),
+    )
+    ingredient_names = [ing.name for ing in _dedupe_ingredients(inventory.ingredients)]
+    logger.info(f"Detected {len(ingredient_names)} ingredients: {ingredient_names}")
+
+    if not ingredient_names:
+        return {"detected_ingredients": [], "recipes": []}
+
+    logger.info("Searching recipes in Actian VectorAI DB...")
+    recipes = await _search_with_preferences_async(ingredient_names, preferences)
+    logger.info(f"Found {len(recipes)} matching recipes")
+
+    return {
+        "detected_ingredients": ingredient_names,
+        "recipes": recipes,
+    }
+
+
 # ── LangChain Agent Mode (optional, set USE_AGENT=true) ──
 
 
+def _ingredient_names(items: list) -> list[str]:
+    """Names from a tool-JSON ingredient list (plain strings or {"name": ...} dicts)."""
+    return [i["name"] if isinstance(i, dict) else i for i in items]
+
+
 @tool
 def analyze_pantry_image(placeholder: str = "") -> str:
     """Analyze the uploaded pantry/fridge image and extract all visible
     food ingredients. Returns a JSON list of detected ingredients with
     names, quantities, and confidence scores."""
-    global _current_image_bytes
+    image_bytes = _image_ctx.get()
+    if not image_bytes:
+        return orjson.dumps({"error": "No image provided"}).decode()
 
-    if not _current_image_bytes:
-        return json.dumps({"error": "No image provided"})
-
-    inventory = gemini.analyze_image(_current_image_bytes)
+    inventory = gemini.analyze_image(image_bytes)
     ingredients = [
         {
             "name": ing.name,
             "quantity": ing.quantity,
             "confidence": ing.confidence,
         }
-        for ing in inventory.ingredients
+        for ing in _dedupe_ingredients(inventory.ingredients)
     ]
-    return json.dumps({"ingredients": ingredients})
+    return orjson.dumps({"ingredients": ingredients}).decode()
 
 
 @tool
@@ -233,27 +414,19 @@ def search_recipes_tool(ingredients_json: str) -> str:
     Args:
         ingredients_json: JSON string like '{"ingredients": ["chicken", "rice", "garlic"]}'
     """
-    global _current_preferences
-
     try:
-        data = json.loads(ingredients_json)
+        data = orjson.loads(ingredients_json)
         if isinstance(data, dict):
-            ingredient_names = [
-                i["name"] if isinstance(i, dict) else i
-                for i in data.get("ingredients", [])
-            ]
-        elif isinstance(data, list):
-            ingredient_names = [i["name"] if isinstance(i, dict) else i for i in data]
-        else:
-            ingredient_names = []
-    except (json.JSONDecodeError, KeyError):
+            data = data.get("ingredients", [])
+        ingredient_names = _ingredient_names(data) if isinstance(data, list) else []
+    except (orjson.JSONDecodeError, KeyError):
         ingredient_names = []
 
     if not ingredient_names:
-        return json.dumps({"error": "No ingredients provided to search"})
+        return orjson.dumps({"error": "No ingredients provided to search"}).decode()
 
-    recipes = _search_with_preferences(ingredient_names, _current_preferences)
-    return json.dumps({"recipes": recipes})
+    recipes = _search_with_preferences(ingredient_names, _prefs_ctx.get(UserPreferences()))
+    return orjson.dumps({"recipes": recipes}).decode()
 
 
 SYSTEM_PROMPT = """You are a helpful recipe recommendation assistant for the "Treat Your-shelf" app.
@@ -276,6 +449,17 @@ PROMPT = ChatPromptTemplate.from_messages(
 )
 
 
+@functools.lru_cache(maxsize=1)
+def _get_executor() -> AgentExecutor:
+    """Build the LangChain agent once and reuse it for every request.
+
+    The executor holds no per-request state (tools read the current image and
+    preferences from ContextVars at call time), so there's no need to rebuild the LLM client,
+    tool schemas and prompt on each scan.
+    """
+    return _create_agent()
+
+
 def _create_agent() -> AgentExecutor:
     """Create a new LangChain agent with Gemini as the LLM backbone."""
     llm = ChatGoogleGenerativeAI(
@@ -290,20 +474,34 @@ def _create_agent() -> AgentExecutor:
     return AgentExecutor(
         agent=agent,
         tools=tools,
-        verbose=True,
+        # Step-by-step stdout tracing blocks the worker; opt in for debugging
+        verbose=settings.AGENT_VERBOSE,
         handle_parsing_errors=True,
         max_iterations=5,
+        return_intermediate_steps=True,
     )
 
 
+def _tool_observations(result: dict) -> dict[str, dict]:
+    """Map tool name -> parsed JSON output of its last call in an agent run."""
+    observations = {}
+    for action, observation in result.get("intermediate_steps", []):
+        try:
+            parsed = orjson.loads(observation)
+        except (TypeError, orjson.JSONDecodeError):
+            continue
+        if isinstance(parsed, dict):
+            observations[action.tool] = parsed
+    return observations
+
+
 def run_agent_mode(
-    image_bytes: bytes,
+    image_bytes: bytes | memoryview,
     preferences: UserPreferences,
 ) -> dict:
     """Run the LangChain agent pipeline. Uses 3-4+ Gemini API calls."""
-    global _current_image_bytes, _current_preferences
-    _current_image_bytes = image_bytes
-    _current_preferences = preferences
+    _image_ctx.set(image_bytes)
+    _prefs_ctx.set(preferences)
 
     parts = [
         "I've uploaded a photo of my pantry/fridge. Please analyze it and find me recipes."
@@ -327,7 +525,7 @@ def run_agent_mode(
 
     user_input = "\n".join(parts)
 
-    executor = _create_agent()
+    executor = _get_executor()
     result = executor.invoke({"input": user_input})
 
     output_text = result.get("output", "")
@@ -335,23 +533,28 @@ def run_agent_mode(
     recipes = []
 
     try:
-        parsed = json.loads(output_text)
+        parsed = orjson.loads(output_text)
         if isinstance(parsed, dict):
             recipes = parsed.get("recipes", [])
-            detected_ingredients = [
-                i["name"] if isinstance(i, dict) else i
-                for i in parsed.get("ingredients", [])
-            ]
-    except json.JSONDecodeError:
+            detected_ingredients = _ingredient_names(parsed.get("ingredients", []))
+    except (orjson.JSONDecodeError, KeyError):
         pass
 
-    # Fallback to direct pipeline if agent didn't return structured data
+    # The final message is often prose; recover whatever the tools already
+    # produced instead of paying for vision / search a second time.
+    observations = _tool_observations(result)
+    if not detected_ingredients:
+        detected_ingredients = _ingredient_names(
+            observations.get(analyze_pantry_image.name, {}).get("ingredients", [])
+        )
     if not recipes:
-        return run_direct_pipeline(image_bytes, preferences)
+        recipes = observations.get(search_recipes_tool.name, {}).get("recipes", [])
 
+    # Fallback to direct calls if the agent didn't return structured data
     if not detected_ingredients:
-        inventory = gemini.analyze_image(image_bytes)
-        detected_ingredients = [ing.name for ing in inventory.ingredients]
+        return run_direct_pipeline(image_bytes, preferences)
+    if not recipes:
+        recipes = _search_with_preferences(detected_ingredients, preferences)
 
     return {
         "detected_ingredients": detected_ingredients,
@@ -362,20 +565,20 @@ def run_agent_mode(
 # ── Public Entry Point ──
 
 
-def run_agent(
-    image_bytes: bytes,
+async def run_agent_async(
+    image_bytes: bytes | memoryview,
     preferences: UserPreferences,
 ) -> dict:
     """Run the recipe recommendation pipeline.
 
     Uses direct pipeline by default (2 API calls).
     Set USE_AGENT=true in .env to use the LangChain agent instead (3-4+ API calls).
+    The LangChain agent has no async tool path here, so agent mode runs on a
+    worker thread.
     """
-    use_agent = settings.USE_AGENT
-
-    if use_agent:
+    if settings.USE_AGENT:
         logger.info("Using LangChain agent mode")
-        return run_agent_mode(image_bytes, preferences)
-    else:
-        logger.info("Using direct pipeline mode")
-        return run_direct_pipeline(image_bytes, preferences)
+        return await asyncio.to_thread(run_agent_mode, image_bytes, preferences)
+
+    logger.info("Using direct pipeline mode")
+    return await run_direct_pipeline_async(image_bytes, preferences)
@@ -0,0 +1,80 @@
+"""
+In-process caches for the scan pipeline.
+
+TTLCache is a small thread-safe LRU with per-entry expiry. content_digest and
+preferences_digest build stable keys so a repeat upload of the same photo
+with the same preferences can skip the whole vision + search pipeline.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+from app.models import UserPreferences
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after insert.
+
+    With ``ttl=None`` entries never expire and it is a plain bounded LRU.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value) -> None:
+        if self.maxsize <= 0 or (self.ttl is not None and self.ttl <= 0):
+            return
+        expires = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "currsize": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+def content_digest(data: bytes | memoryview) -> str:
+    """128-bit blake2b digest of raw bytes, as 32 hex chars."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def preferences_digest(preferences: UserPreferences) -> str:
+    """Hash preferences in a normalized form (lowercased, trimmed, lists sorted)."""
+    normalized = {}
+    for field, value in preferences.model_dump().items():
+        if isinstance(value, list):
+            value = sorted({v.lower().strip() for v in value})
+        elif isinstance(value, str):
+            value = value.lower().strip()
+        normalized[field] = value
+    encoded = orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
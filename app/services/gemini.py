@@ -1,18 +1,28 @@
 from google import genai
 from google.genai import types
 import PIL.Image
+import PIL.ImageOps
+import numpy as np
+import asyncio
 import io
+import random
+import re
+import threading
 import time
 import logging
+from pydantic import TypeAdapter
 
 from app.config import settings
-from app.models import PantryInventory, RecipeList, UserPreferences
+from app.models import PantryInventory, RecipeList, RecipeResult, UserPreferences
+from app.services import cache
 
 logger = logging.getLogger(__name__)
 
 # Maximum retries for rate-limited or transient Gemini API errors
 _MAX_RETRIES = 3
 _BASE_BACKOFF = 2  # seconds
+# Don't hold a scan open longer than this waiting out a rate limit
+_MAX_RETRY_WAIT = 30  # seconds
 
 
 # ── Gemini Client (for Vision only) ──
@@ -23,26 +33,55 @@ _client = genai.Client(api_key=settings.GEMINI_API_KEY)
 # ── Local Embedding Model (sentence-transformers) ──
 
 _embedder = None
+_embedder_lock = threading.Lock()
 
 
 def _get_embedder():
     """Lazy-load the sentence-transformers model.
 
     Loads on first call so the server starts fast.
-    Uses GPU if available (CUDA), otherwise CPU.
+    Uses GPU if available (CUDA), otherwise CPU. With EMBEDDING_BACKEND=onnx
+    (optionally pointing EMBEDDING_ONNX_FILE at an int8 quantized export)
+    inference runs on ONNX Runtime instead of PyTorch; pooling and
+    normalization stay inside sentence-transformers either way.
     """
     global _embedder
     if _embedder is None:
-        from sentence_transformers import SentenceTransformer
-
-        model_name = settings.EMBEDDING_MODEL_NAME
-        logger.info(f"Loading embedding model: {model_name}")
-        _embedder = SentenceTransformer(model_name)
-        device = _embedder.device
-        logger.info(f"Embedding model loaded on {device}")
+        with _embedder_lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+
+                model_name = settings.EMBEDDING_MODEL_NAME
+                backend = settings.EMBEDDING_BACKEND
+                model_kwargs = {}
+                if backend != "torch" and settings.EMBEDDING_ONNX_FILE:
+                    model_kwargs["file_name"] = settings.EMBEDDING_ONNX_FILE
+                logger.info(f"Loading embedding model: {model_name} ({backend})")
+                _embedder = SentenceTransformer(
+                    model_name, backend=backend, model_kwargs=model_kwargs or None,
+                )
+                device = _embedder.device
+                logger.info(f"Embedding model loaded on {device}")
     return _embedder
 
 
+def load_embedder() -> None:
+    """Make sure the embedding model is loaded (no-op once it is)."""
+    _get_embedder()
+
+
+def warmup_embedder() -> None:
+    """Load the embedding model and run one throwaway encode.
+
+    Called at server startup so the first scan doesn't pay the model load
+    and first-forward-pass (kernel selection / CUDA init) cost. Bypasses the
+    query cache so the dummy text isn't stored.
+    """
+    t0 = time.time()
+    _get_embedder().encode(["warmup"], normalize_embeddings=True)
+    logger.info(f"Embedding model warmed up in {time.time() - t0:.1f}s")
+
+
 def _is_retryable(exc: Exception) -> bool:
     """Check if a Gemini API error is retryable (rate limit or transient)."""
     exc_str = str(exc).lower()
@@ -50,73 +89,333 @@ def _is_retryable(exc: Exception) -> bool:
     return any(code in exc_str for code in ["429", "resource_exhausted", "503", "500", "unavailable", "deadline"])
 
 
+# 429 responses carry a google.rpc.RetryInfo detail, e.g. 'retryDelay': '37s'
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def _retry_wait(exc: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying, or None if the error should be raised.
+
+    Uses the server's retryDelay hint when there is one, else exponential
+    backoff; either way with up to 25% jitter so concurrent scans that hit
+    the limit together don't retry in lockstep.
+    """
+    if attempt >= _MAX_RETRIES - 1 or not _is_retryable(exc):
+        return None
+    hint = _RETRY_DELAY_RE.search(str(exc))
+    wait = float(hint.group(1)) if hint else _BASE_BACKOFF * (2 ** attempt)
+    if wait > _MAX_RETRY_WAIT:
+        return None
+    return wait * random.uniform(1.0, 1.25)
+
+
+def _retry_delay(tag: str, exc: Exception, attempt: int, t0: float) -> float:
+    """Log a failed Gemini call and return the wait before the next attempt.
+
+    Re-raises ``exc`` when it shouldn't be retried (see _retry_wait()).
+    """
+    elapsed = time.time() - t0
+    logger.warning(f"[{tag}] Attempt {attempt + 1} failed after {elapsed:.1f}s: {exc}")
+    wait = _retry_wait(exc, attempt)
+    if wait is None:
+        raise exc
+    logger.info(f"[{tag}] Retrying in {wait:.1f}s…")
+    return wait
+
+
 # ── Image Analysis (Gemini Vision) ──
 
 
-def analyze_image(image_bytes: bytes) -> PantryInventory:
+# Built once per process. Too short (~60 tokens) for a Gemini explicit context
+# cache, which has a minimum cached size of about a thousand tokens; implicit
+# prefix caching on the API side still applies since the prefix never changes.
+_VISION_PROMPT = (
+    "Extract all visible food ingredients from this image. "
+    "For each ingredient, provide the name, estimated quantity if visible, "
+    "and your confidence score (0-1) that the item is correctly identified. "
+    "Only include actual food items, not containers, appliances, or packaging."
+)
+_VISION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": PantryInventory,
+}
+
+
+# Gemini tiles/downsamples large images anyway; sending more pixels than this
+# only costs upload time and vision tokens.
+_VISION_MAX_EDGE = 1024
+_VISION_JPEG_QUALITY = 85
+# Formats Gemini accepts as uploaded; anything else (GIF, BMP, TIFF, MPO, …)
+# is re-encoded even when it is small enough.
+_VISION_PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def _image_part(image_bytes: bytes | memoryview) -> types.Part:
+    """Wrap the uploaded image as an inline Part for the vision call.
+
+    JPEG, PNG and WEBP images already within _VISION_MAX_EDGE are sent as-is
+    (PIL only parses the header to sniff the format). Larger photos and other
+    formats are downscaled to that long edge if needed and re-encoded as JPEG,
+    which cuts a multi-MB phone photo to a couple hundred KB.
+    """
+    data = bytes(image_bytes)  # no copy for bytes; the one copy for a memoryview
+    img = PIL.Image.open(io.BytesIO(data))
+    mime_type = _VISION_PASSTHROUGH_FORMATS.get(img.format)
+    if mime_type and max(img.size) <= _VISION_MAX_EDGE:
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+    # For JPEGs, decode at the smallest DCT scale (1/2, 1/4, 1/8) that still
+    # covers the target, so a 48MP photo never materializes at full size.
+    # No-op for other formats.
+    img.draft("RGB", (_VISION_MAX_EDGE, _VISION_MAX_EDGE))
+    img = PIL.ImageOps.exif_transpose(img)  # re-encoding drops the EXIF rotation
+    img.thumbnail((_VISION_MAX_EDGE, _VISION_MAX_EDGE), PIL.Image.Resampling.LANCZOS)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=_VISION_JPEG_QUALITY)
+    return types.Part.from_bytes(data=buf.getvalue(), mime_type="image/jpeg")
+
+
+# Byte-identical uploads (double submits, retries, demo photos) reuse the
+# parsed result instead of paying for another multi-second vision call.
+_vision_cache = cache.TTLCache(maxsize=settings.VISION_CACHE_SIZE, ttl=settings.VISION_CACHE_TTL)
+
+
+def _cached_inventory(image_bytes: bytes | memoryview) -> tuple[str, PantryInventory | None]:
+    """Vision cache key for an image, and a copy of its cached result if any."""
+    key = cache.content_digest(image_bytes)
+    inventory = _vision_cache.get(key)
+    if inventory is not None:
+        logger.info("[analyze_image] Vision cache hit")
+        # Hand out a copy so callers can't mutate the cached entry
+        inventory = inventory.model_copy(deep=True)
+    return key, inventory
+
+
+def _store_inventory(tag: str, key: str, response, t0: float) -> PantryInventory:
+    """Log a completed vision call and cache its parsed inventory."""
+    logger.info(f"[{tag}] Completed in {time.time() - t0:.1f}s")
+    inventory = response.parsed
+    if inventory is not None:
+        _vision_cache.set(key, inventory.model_copy(deep=True))
+    return inventory
+
+
+def vision_cache_info() -> dict:
+    """Hit/miss statistics for the vision result cache."""
+    return _vision_cache.info()
+
+
+def analyze_image(image_bytes: bytes | memoryview) -> PantryInventory:
     """Use Gemini Vision to extract ingredients from a pantry/fridge image.
 
-    Includes retry logic for rate-limited requests.
+    Includes retry logic for rate-limited requests. Results are cached by
+    a hash of the raw image bytes.
     """
-    img = PIL.Image.open(io.BytesIO(image_bytes))
+    key, cached = _cached_inventory(image_bytes)
+    if cached is not None:
+        return cached
+    image_part = _image_part(image_bytes)
 
     for attempt in range(_MAX_RETRIES):
+        t0 = time.time()
+        logger.info(f"[analyze_image] Calling Gemini Vision (attempt {attempt + 1})…")
         try:
-            t0 = time.time()
-            logger.info(f"[analyze_image] Calling Gemini Vision (attempt {attempt + 1})…")
             response = _client.models.generate_content(
                 model=settings.GEMINI_MODEL,
-                contents=[
-                    "Extract all visible food ingredients from this image. "
-                    "For each ingredient, provide the name, estimated quantity if visible, "
-                    "and your confidence score (0-1) that the item is correctly identified. "
-                    "Only include actual food items, not containers, appliances, or packaging.",
-                    img,
-                ],
-                config={
-                    "response_mime_type": "application/json",
-                    "response_schema": PantryInventory,
-                },
+                contents=[_VISION_PROMPT, image_part],
+                config=_VISION_CONFIG,
             )
-            elapsed = time.time() - t0
-            logger.info(f"[analyze_image] Completed in {elapsed:.1f}s")
-            return response.parsed
+        except Exception as e:
+            time.sleep(_retry_delay("analyze_image", e, attempt, t0))
+            continue
+        return _store_inventory("analyze_image", key, response, t0)
+
+
+async def analyze_image_async(image_bytes: bytes | memoryview) -> PantryInventory:
+    """Async variant of analyze_image() using the SDK's native aio client.
+
+    Awaiting the request frees the event loop for other scans while Gemini
+    works, instead of parking a thread-pool worker on the call.
+    """
+    key, cached = _cached_inventory(image_bytes)
+    if cached is not None:
+        return cached
+    # Decoding and resizing a large photo is CPU work; keep it off the loop
+    image_part = await asyncio.to_thread(_image_part, image_bytes)
 
+    for attempt in range(_MAX_RETRIES):
+        t0 = time.time()
+        logger.info(f"[analyze_image_async] Calling Gemini Vision (attempt {attempt + 1})…")
+        try:
+            response = await _client.aio.models.generate_content(
+                model=settings.GEMINI_MODEL,
+                contents=[_VISION_PROMPT, image_part],
+                config=_VISION_CONFIG,
+            )
         except Exception as e:
-            elapsed = time.time() - t0
-            logger.warning(f"[analyze_image] Attempt {attempt + 1} failed after {elapsed:.1f}s: {e}")
-            if attempt < _MAX_RETRIES - 1 and _is_retryable(e):
-                wait = _BASE_BACKOFF * (2 ** attempt)
-                logger.info(f"[analyze_image] Retrying in {wait}s…")
-                time.sleep(wait)
-            else:
-                raise
+            await asyncio.sleep(_retry_delay("analyze_image_async", e, attempt, t0))
+            continue
+        return _store_inventory("analyze_image_async", key, response, t0)
 
 
 # ── Text Embeddings (Local, sentence-transformers) ──
 
 
-def generate_embedding(text: str) -> list[float]:
-    """Generate an embedding vector using the local sentence-transformers model."""
+# Identical scans (same detected ingredients + preferences) produce the same
+# query texts, so repeats skip the model forward pass entirely. Vectors are
+# kept as read-only float32 arrays: ~3 KB each instead of ~25 KB of boxed
+# Python floats, and cached entries can't be mutated by callers.
+_query_cache = cache.TTLCache(maxsize=4096, ttl=None)
+
+
+def _encode_and_cache(texts: list[str]) -> list[np.ndarray]:
+    """Encode texts in one forward pass and store each vector in the cache."""
     model = _get_embedder()
-    vector = model.encode(text, normalize_embeddings=True)
-    return vector.tolist()
+    matrix = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    vectors = []
+    for text, row in zip(texts, matrix.astype(np.float32)):
+        row.flags.writeable = False
+        _query_cache.set(text, row)
+        vectors.append(row)
+    return vectors
+
+
+def embed_queries(texts: list[str]) -> list[np.ndarray]:
+    """Embed a request's query texts, encoding only the cache misses (in one batch).
+
+    Returns read-only float32 vectors; callers pass them straight to
+    vector_db, which converts to a list only when handing them to Cortex.
+    """
+    vectors = [_query_cache.get(t) for t in texts]
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        fresh = dict(zip(missing, _encode_and_cache(missing)))
+        vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+    return vectors
+
 
+def generate_embedding(text: str) -> np.ndarray:
+    """Generate an embedding vector using the local sentence-transformers model."""
+    return embed_queries([text])[0]
+
+
+def embedding_cache_info() -> dict:
+    """Hit/miss statistics for the query embedding cache."""
+    return _query_cache.info()
+
+
+class EmbeddingBatcher:
+    """Coalesce embedding requests from concurrent scans into one encode() call.
+
+    Requests queue up for at most ``max_wait`` seconds (or until ``max_batch``
+    texts are waiting) and are then encoded in a single forward pass on a
+    worker thread; each caller gets its own slice back through a future.
+    """
 
-def generate_embeddings_batch(texts: list[str]) -> list[list[float]]:
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.01):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def embed(self, texts: list[str]) -> list[np.ndarray]:
+        if self._worker is None or self._worker.done():
+            # A stopped worker has already failed whatever was left in its queue
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(self._queue))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def close(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                size = len(batch[0][0])
+                deadline = loop.time() + self.max_wait
+                while size < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+
+                texts = list(dict.fromkeys(t for item_texts, _ in batch for t in item_texts))
+                try:
+                    vectors = await asyncio.to_thread(_encode_and_cache, texts)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                by_text = dict(zip(texts, vectors))
+                for item_texts, future in batch:
+                    if not future.done():
+                        future.set_result([by_text[t] for t in item_texts])
+        finally:
+            # Fail the in-flight batch and everything still queued, so no
+            # caller waits forever on a worker that has stopped
+            pending = [future for _, future in batch]
+            while not queue.empty():
+                pending.append(queue.get_nowait()[1])
+            for future in pending:
+                if not future.done():
+                    future.set_exception(RuntimeError("embedding batcher closed"))
+
+_batcher = EmbeddingBatcher()
+
+
+async def embed_queries_async(texts: list[str]) -> list[np.ndarray]:
+    """Async embed_queries(): cache misses go through the shared micro-batcher."""
+    vectors = [_query_cache.get(t) for t in texts]
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        fresh = dict(zip(missing, await _batcher.embed(missing)))
+        vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+    return vectors
+
+
+async def close_batcher() -> None:
+    """Stop the micro-batcher's background task (server shutdown)."""
+    await _batcher.close()
+
+
+def generate_embeddings_batch(texts: list[str]) -> np.ndarray:
     """Generate embeddings for a batch of texts using the local model.
 
     On GPU this is very fast (thousands per second).
     On CPU it's still fine for small batches.
+    Returns a (len(texts), dim) float32 array.
     """
     model = _get_embedder()
-    vectors = model.encode(texts, normalize_embeddings=True, batch_size=128)
-    return vectors.tolist()
+    vectors = model.encode(
+        texts, normalize_embeddings=True, batch_size=128, convert_to_numpy=True,
+    )
+    return vectors.astype(np.float32, copy=False)
 
 
 # ── Recipe Generation (Direct LLM, no DB) ──
 
 
+# One serializer for the whole list instead of a model_dump() per recipe
+_RECIPE_LIST_ADAPTER = TypeAdapter(list[RecipeResult])
+
+
 def generate_recipes(
     ingredients: list[str],
     preferences: UserPreferences,
@@ -150,9 +449,9 @@ def generate_recipes(
     prompt = "\n".join(prompt_parts)
 
     for attempt in range(_MAX_RETRIES):
+        t0 = time.time()
+        logger.info(f"[generate_recipes] Calling Gemini (attempt {attempt + 1})…")
         try:
-            t0 = time.time()
-            logger.info(f"[generate_recipes] Calling Gemini (attempt {attempt + 1})…")
             response = _client.models.generate_content(
                 model=settings.GEMINI_MODEL,
                 contents=[prompt],
@@ -161,18 +460,11 @@ def generate_recipes(
                     "response_schema": RecipeList,
                 },
             )
-            elapsed = time.time() - t0
-            logger.info(f"[generate_recipes] Completed in {elapsed:.1f}s")
-
-            # Convert Pydantic models to dicts for consistency with the rest of the app
-            return [r.model_dump() for r in response.parsed.recipes]
-
         except Exception as e:
-            elapsed = time.time() - t0
-            logger.warning(f"[generate_recipes] Attempt {attempt + 1} failed after {elapsed:.1f}s: {e}")
-            if attempt < _MAX_RETRIES - 1 and _is_retryable(e):
-                wait = _BASE_BACKOFF * (2 ** attempt)
-                logger.info(f"[generate_recipes] Retrying in {wait}s…")
-                time.sleep(wait)
-            else:
-                raise
+            time.sleep(_retry_delay("generate_recipes", e, attempt, t0))
+            continue
+        elapsed = time.time() - t0
+        logger.info(f"[generate_recipes] Completed in {elapsed:.1f}s")
+
+        # Convert Pydantic models to dicts for consistency with the rest of the app
+        return _RECIPE_LIST_ADAPTER.dump_python(response.parsed.recipes)
@@ -1,5 +1,12 @@
 import sys
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
 
 # Add the Actian wheel's install location to the path so we can import cortex
 _ACTIAN_VENV = os.path.join(
@@ -24,13 +31,130 @@ from cortex.filters import Filter, Field
 from app.config import settings
 
 
-def get_client() -> CortexClient:
+# Pool slots hold a connected client, or None for one dropped after an
+# error; the next borrower of an empty slot reconnects it.
+_pool: queue.Queue | None = None
+_pool_lock = threading.Lock()
+
+# Longest wait for a free pooled client before giving up, in seconds
+_BORROW_TIMEOUT = 30.0
+# After a failed connect, new attempts fail fast for this many seconds so
+# requests fall back right away instead of each waiting on a dead DB.
+_RECONNECT_COOLDOWN = 10.0
+_last_connect_failure: float | None = None
+
+
+def _new_client() -> CortexClient:
     """Create a new sync Cortex client."""
     return CortexClient(settings.ACTIAN_DB_ADDRESS)
 
 
+def _close(client: CortexClient) -> None:
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def _connect() -> CortexClient:
+    """Create and connect a client, failing fast during the reconnect cooldown."""
+    global _last_connect_failure
+    if (
+        _last_connect_failure is not None
+        and time.monotonic() - _last_connect_failure < _RECONNECT_COOLDOWN
+    ):
+        raise ConnectionError(
+            f"Actian DB at {settings.ACTIAN_DB_ADDRESS} was unreachable moments ago"
+        )
+    client = _new_client()
+    try:
+        client.connect()
+    except Exception:
+        _last_connect_failure = time.monotonic()
+        _close(client)
+        raise
+    _last_connect_failure = None
+    return client
+
+
+def open_pool(size: int | None = None) -> queue.Queue:
+    """Open the shared pool of connected Cortex clients, if not already open.
+
+    Connections are opened once and reused, so requests skip the channel
+    handshake. ``size`` defaults to MAX_DB_CONNS (capped at 8) and only
+    applies when the pool is first created. Call close_pool() on shutdown.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = size or min(settings.MAX_DB_CONNS, 8)
+                pool = queue.Queue()
+                try:
+                    for _ in range(size):
+                        pool.put(_connect())
+                except Exception:
+                    _drain(pool)
+                    raise
+                _pool = pool
+    return _pool
+
+
+@contextmanager
+def borrow_client() -> Iterator[CortexClient]:
+    """Borrow a connected client from the pool for the duration of a block.
+
+    Waits up to _BORROW_TIMEOUT for a free client, so at most pool-size
+    calls hit the DB at once. If the block raises, the client is closed
+    rather than handed to the next caller, since its connection may be
+    broken; the slot is reconnected on its next borrow.
+    """
+    pool = open_pool()
+    try:
+        client = pool.get(timeout=_BORROW_TIMEOUT)
+    except queue.Empty:
+        raise TimeoutError(
+            f"No Actian DB connection became free within {_BORROW_TIMEOUT:.0f}s"
+        ) from None
+    try:
+        if client is None:
+            client = _connect()
+        yield client
+    except Exception:
+        if client is not None:
+            _close(client)
+        client = None
+        raise
+    finally:
+        pool.put(client)
+
+
+def _drain(pool: queue.Queue) -> None:
+    while True:
+        try:
+            client = pool.get_nowait()
+        except queue.Empty:
+            return
+        if client is not None:
+            _close(client)
+
+
+def close_pool() -> None:
+    """Close every idle pooled client and forget the pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _drain(_pool)
+            _pool = None
+
+
 def ensure_collection(client: CortexClient) -> None:
-    """Create the recipes collection if it doesn't exist."""
+    """Create the recipes collection if it doesn't exist.
+
+    Vectors are stored as FP32. The Cortex client takes no quantization or
+    rescoring options here, so int8/binary storage would have to be enabled
+    server-side; the embedding side needs no change if it is.
+    """
     client.get_or_create_collection(
         name=settings.COLLECTION_NAME,
         dimension=settings.EMBEDDING_DIMENSION,
@@ -41,10 +165,12 @@ def ensure_collection(client: CortexClient) -> None:
 def upsert_recipe(
     client: CortexClient,
     recipe_id: int,
-    vector: list[float],
+    vector: np.ndarray | list[float],
     payload: dict,
 ) -> None:
     """Insert or update a single recipe vector."""
+    if isinstance(vector, np.ndarray):
+        vector = vector.tolist()
     client.upsert(
         collection_name=settings.COLLECTION_NAME,
         id=recipe_id,
@@ -56,10 +182,16 @@ def upsert_recipe(
 def batch_upsert_recipes(
     client: CortexClient,
     ids: list[int],
-    vectors: list[list[float]],
+    vectors: np.ndarray | list[list[float]],
     payloads: list[dict],
 ) -> None:
-    """Batch insert recipe vectors."""
+    """Batch insert recipe vectors.
+
+    ``vectors`` may be a 2-D float32 array (e.g. a slice of the embedder's
+    output); it is converted to lists only here, for the Cortex client.
+    """
+    if isinstance(vectors, np.ndarray):
+        vectors = vectors.tolist()
     client.batch_upsert(
         collection_name=settings.COLLECTION_NAME,
         ids=ids,
@@ -70,14 +202,19 @@ def batch_upsert_recipes(
 
 def search_recipes(
     client: CortexClient,
-    query_vector: list[float],
+    query_vector: np.ndarray | list[float],
     top_k: int = 10,
     filter_obj: Filter | None = None,
 ) -> list[dict]:
     """Search for similar recipes by vector, optionally with filters.
 
+    Accepts the embedder's float32 ndarray directly; it is turned into the
+    plain float list the Cortex client expects only here, at the boundary.
+
     Returns a list of dicts with keys: id, score, payload.
     """
+    if isinstance(query_vector, np.ndarray):
+        query_vector = query_vector.tolist()
     kwargs = {
         "collection_name": settings.COLLECTION_NAME,
         "query": query_vector,
@@ -91,13 +228,28 @@ def search_recipes(
     return [{"id": r.id, "score": r.score, "payload": r.payload} for r in results]
 
 
+# Boolean tag_<name> payload fields written by scripts/ingest_recipes.py
+KNOWN_DIETARY_TAGS = (
+    "vegetarian", "vegan", "gluten-free", "dairy-free", "nut-free", "shellfish-free",
+)
+
+# Filter conditions are the same for every request, so build them once.
+_TAG_FIELDS = {tag: Field(f"tag_{tag}").eq(True) for tag in KNOWN_DIETARY_TAGS}
+_SKILL_LEVEL_MAX_STEPS = {"beginner": 4, "intermediate": 8, "advanced": 999}
+_SKILL_LEVEL_FILTERS = {
+    level: Field("num_steps").lte(max_steps)
+    for level, max_steps in _SKILL_LEVEL_MAX_STEPS.items()
+}
+_ANY_SKILL_LEVEL = _SKILL_LEVEL_FILTERS["advanced"]
+
+
 def build_recipe_filter(
     dietary_restrictions: list[str] | None = None,
     skill_level: str | None = None,
 ) -> Filter:
     """Build a payload filter from user preferences.
 
-    Dietary restrictions are matched against the auto-inferred dietary_tags
+    Dietary restrictions are matched against the auto-inferred tag_* flags
     stored in each recipe's payload. For example, if the user specifies
     'vegetarian', we filter for recipes tagged as vegetarian.
 
@@ -106,20 +258,21 @@ def build_recipe_filter(
     f = Filter()
 
     # Dietary restriction filtering:
-    # Each recipe payload has dietary_tags like ["vegetarian", "gluten-free"].
-    # If a user requests "vegetarian", we want recipes that have "vegetarian"
-    # in their dietary_tags. Actian's filter DSL supports field equality,
-    # so we filter on individual tag fields stored as booleans.
+    # Each recipe payload has boolean fields like tag_vegetarian and
+    # tag_gluten-free. If a user requests "vegetarian", we want recipes with
+    # tag_vegetarian set. Actian's filter DSL supports field equality, so we
+    # filter on these individual tag fields.
     if dietary_restrictions:
         for tag in dietary_restrictions:
             normalized = tag.lower().strip()
-            f = f.must(Field(f"tag_{normalized}").eq(True))
+            condition = _TAG_FIELDS.get(normalized)
+            if condition is None:
+                condition = Field(f"tag_{normalized}").eq(True)
+            f = f.must(condition)
 
     # Skill level filtering
     if skill_level:
-        level_map = {"beginner": 4, "intermediate": 8, "advanced": 999}
-        max_steps = level_map.get(skill_level.lower(), 999)
-        f = f.must(Field("num_steps").lte(max_steps))
+        f = f.must(_SKILL_LEVEL_FILTERS.get(skill_level.lower(), _ANY_SKILL_LEVEL))
 
     return f
 
@@ -127,3 +280,30 @@ def build_recipe_filter(
 def get_collection_count(client: CortexClient) -> int:
     """Get the number of vectors in the recipes collection."""
     return client.count(settings.COLLECTION_NAME)
+
+
+def diagnostics(client: CortexClient, sample_size: int = 10) -> dict:
+    """Probe the recipes collection over one connection.
+
+    Returns ``{count, sample_titles, samples, latency_ms}``, where samples
+    are the payloads of the nearest neighbours of a fixed random unit
+    vector. An all-zero probe would leave cosine distance undefined.
+    latency_ms holds per-call round-trip times.
+    """
+    t0 = time.perf_counter()
+    count = get_collection_count(client)
+    count_ms = (time.perf_counter() - t0) * 1000
+
+    probe = np.random.default_rng(0).standard_normal(settings.EMBEDDING_DIMENSION)
+    probe = (probe / np.linalg.norm(probe)).astype(np.float32)
+    t0 = time.perf_counter()
+    hits = search_recipes(client, probe, top_k=sample_size)
+    search_ms = (time.perf_counter() - t0) * 1000
+
+    samples = [hit["payload"] or {} for hit in hits]
+    return {
+        "count": count,
+        "sample_titles": [p.get("title", "No Title") for p in samples],
+        "samples": samples,
+        "latency_ms": {"count": round(count_ms, 1), "search": round(search_ms, 1)},
+    }
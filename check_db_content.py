@@ -1,45 +1,35 @@
 
 from app.services import vector_db
-from app.config import settings
 import sys
 
 def check_db():
     print(f"Connecting...")
-    client = vector_db.get_client()
     try:
-        client.connect()
-        count = vector_db.get_collection_count(client)
-        print(f"Total recipes: {count}")
-        
-        print("\nSearching to inspect content...")
-        # Create dummy vector of dimension 768
-        dummy_vec = [0.0] * settings.EMBEDDING_DIMENSION
-        
-        # Search for top 10
-        try:
-            results = client.search(
-                collection_name=settings.COLLECTION_NAME,
-                query=dummy_vec,
-                top_k=10,
-                with_payload=True
-            )
-            
-            print(f"Found {len(results)} results.")
-            for i, r in enumerate(results):
-                payload = r.payload
+        vector_db.open_pool(size=1)
+        with vector_db.borrow_client() as client:
+            print("\nSearching to inspect content...")
+            try:
+                report = vector_db.diagnostics(client, sample_size=10)
+            except Exception as e:
+                print(f"Diagnostics failed: {e}")
+                return
+
+            print(f"Total recipes: {report['count']}")
+            print(f"Found {len(report['samples'])} results.")
+            for i, payload in enumerate(report["samples"]):
                 title = payload.get("title", "No Title")
                 steps = payload.get("num_steps")
                 skill = payload.get("skill_level")
-                
+
                 print(f"Recipe {i}: {title}")
                 print(f"  Steps: {steps}")
                 print(f"  Skill: {skill}")
-                
-        except Exception as e:
-            print(f"Search failed: {e}")
+
+            latency = report["latency_ms"]
+            print(f"\nLatency: count {latency['count']}ms, search {latency['search']}ms")
             
     finally:
-        client.close()
+        vector_db.close_pool()
 
 if __name__ == "__main__":
     check_db()
@@ -3,32 +3,27 @@ from app.services import vector_db
 import sys
 
 def check_count():
-    print(f"Getting client...")
-    client = vector_db.get_client()
-    print(f"Client object: {client}")
-    
-    if client is None:
-        print("Error: Client is None")
-        return
-
     try:
         print("Connecting to DB...")
-        client.connect()
-        print("Connected.")
-        
-        print("Checking count...")
-        try:
-            vector_db.ensure_collection(client)
-            count = vector_db.get_collection_count(client)
-            print(f"Total recipes in DB: {count}")
-        except Exception as e:
-            print(f"Error calling get_collection_count: {e}")
+        vector_db.open_pool(size=1)
+        with vector_db.borrow_client() as client:
+            print(f"Connected. Client object: {client}")
+
+            print("Checking count...")
+            try:
+                vector_db.ensure_collection(client)
+                report = vector_db.diagnostics(client, sample_size=1)
+                print(f"Total recipes in DB: {report['count']}")
+                print(f"Latency: count {report['latency_ms']['count']}ms, "
+                      f"search {report['latency_ms']['search']}ms")
+            except Exception as e:
+                print(f"Error running diagnostics: {e}")
             
     except Exception as e:
         print(f"Error during connection or check: {e}")
     finally:
         try:
-            client.close()
+            vector_db.close_pool()
             print("Client closed.")
         except:
             pass
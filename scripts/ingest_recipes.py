@@ -2,19 +2,28 @@
 Recipe Ingestion Script for Treat Your-shelf
 
 Reads the Kaggle recipe JSON dataset, auto-infers dietary tags and skill level,
-generates embeddings via Gemini text-embedding-004, and upserts everything into
-the Actian VectorAI DB.
+generates embeddings with the local sentence-transformers model, and upserts
+everything into the Actian VectorAI DB.
 
 Usage:
     cd backend
     python -m scripts.ingest_recipes [--limit N] [--batch-size N]
 """
 
-import json
+import functools
+import hashlib
+import re
+import sqlite3
 import sys
 import os
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
+
+import numpy as np
+import orjson
 
 # Add backend to path so we can import app modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -202,54 +211,106 @@ SHELLFISH_KEYWORDS = {
 }
 
 
-def _text_contains_any(text: str, keywords: set[str]) -> bool:
-    """Check if lowercased text contains any of the keywords."""
+# Bit per category, in the order infer_dietary_tags() reads them back
+_CATEGORY_KEYWORDS = (
+    MEAT_KEYWORDS,
+    SEAFOOD_KEYWORDS,
+    DAIRY_KEYWORDS,
+    EGG_KEYWORDS,
+    GLUTEN_KEYWORDS,
+    NUT_KEYWORDS,
+    SHELLFISH_KEYWORDS,
+)
+_ALL_CATEGORIES = (1 << len(_CATEGORY_KEYWORDS)) - 1
+
+
+def _trie_pattern(words) -> str:
+    """Regex alternation for ``words`` factored into a prefix trie.
+
+    The re engine then picks a branch per character instead of retrying
+    every keyword at every position, and a match is always the longest
+    keyword starting there.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        group = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{group})?" if "" in node else group
+
+    return build(trie)
+
+
+def _keyword_bits() -> dict[str, int]:
+    """Category bits for each keyword, including those of its keyword prefixes.
+
+    A scan reports only the longest keyword at each position, so "clams"
+    (shellfish) must also carry the seafood bit of "clam". A keyword inside
+    another ("butter" in "peanut butter") is still found at its own position.
+    """
+    keywords = set().union(*_CATEGORY_KEYWORDS)
+    bits = {}
     for kw in keywords:
-        if kw in text:
-            return True
-    return False
+        bits[kw] = 0
+        for i, category in enumerate(_CATEGORY_KEYWORDS):
+            if any(kw.startswith(other) for other in category):
+                bits[kw] |= 1 << i
+    return bits
+
+
+_KEYWORD_BITS = _keyword_bits()
+# Lookahead so overlapping keywords at every position are reported
+_KEYWORD_RE = re.compile(f"(?=({_trie_pattern(_KEYWORD_BITS)}))")
 
 
-def infer_dietary_tags(ingredients: list[str]) -> dict:
-    """Auto-infer dietary tags from ingredient list.
+# Template-style datasets repeat whole ingredient lists; the key is the joined
+# text and the value an int, so cached results can't be mutated by callers.
+@functools.lru_cache(maxsize=100_000)
+def _keyword_categories(text: str) -> int:
+    """One pass over lowercased text; returns the bitmask of matched categories.
 
-    Returns a dict with both the tag list and individual boolean flags
-    (for Actian payload filtering).
+    Same result as testing every keyword with ``kw in text``.
     """
-    text = " ".join(ingredients).lower()
-
-    has_meat = _text_contains_any(text, MEAT_KEYWORDS)
-    has_seafood = _text_contains_any(text, SEAFOOD_KEYWORDS)
-    has_dairy = _text_contains_any(text, DAIRY_KEYWORDS)
-    has_eggs = _text_contains_any(text, EGG_KEYWORDS)
-    has_gluten = _text_contains_any(text, GLUTEN_KEYWORDS)
-    has_nuts = _text_contains_any(text, NUT_KEYWORDS)
-    has_shellfish = _text_contains_any(text, SHELLFISH_KEYWORDS)
-
-    tags = []
-
-    if not has_meat and not has_seafood:
-        tags.append("vegetarian")
-    if not has_meat and not has_seafood and not has_dairy and not has_eggs:
-        tags.append("vegan")
-    if not has_gluten:
-        tags.append("gluten-free")
-    if not has_dairy:
-        tags.append("dairy-free")
-    if not has_nuts:
-        tags.append("nut-free")
-    if not has_shellfish:
-        tags.append("shellfish-free")
+    flags = 0
+    for match in _KEYWORD_RE.finditer(text):
+        flags |= _KEYWORD_BITS[match.group(1)]
+        if flags == _ALL_CATEGORIES:
+            break
+    return flags
+
+
+def infer_dietary_tags(ingredients_text: str) -> dict:
+    """Auto-infer dietary tags from the lowercased, joined ingredient list.
+
+    Returns one boolean ``tag_<name>`` flag per tag, for Actian payload
+    filtering. No separate tag list is stored; search results rebuild it
+    from these flags.
+    """
+    flags = _keyword_categories(ingredients_text)
+    has_meat = bool(flags & 1)
+    has_seafood = bool(flags & 2)
+    has_dairy = bool(flags & 4)
+    has_eggs = bool(flags & 8)
+    has_gluten = bool(flags & 16)
+    has_nuts = bool(flags & 32)
+    has_shellfish = bool(flags & 64)
+
+    vegetarian = not has_meat and not has_seafood
 
     return {
-        "dietary_tags": tags,
-        # Boolean flags for Actian payload filtering
-        "tag_vegetarian": "vegetarian" in tags,
-        "tag_vegan": "vegan" in tags,
-        "tag_gluten-free": "gluten-free" in tags,
-        "tag_dairy-free": "dairy-free" in tags,
-        "tag_nut-free": "nut-free" in tags,
-        "tag_shellfish-free": "shellfish-free" in tags,
+        "tag_vegetarian": vegetarian,
+        "tag_vegan": vegetarian and not has_dairy and not has_eggs,
+        "tag_gluten-free": not has_gluten,
+        "tag_dairy-free": not has_dairy,
+        "tag_nut-free": not has_nuts,
+        "tag_shellfish-free": not has_shellfish,
     }
 
 
@@ -263,11 +324,33 @@ def infer_skill_level(num_steps: int) -> str:
         return "advanced"
 
 
+def as_str_list(value) -> list[str]:
+    """Coerce a recipe field to a native list of strings.
+
+    Some dataset rows carry lists serialized as JSON strings; decoding them
+    here means search results never have to re-parse the payload.
+    """
+    if isinstance(value, str):
+        try:
+            value = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return [value] if value else []
+        if isinstance(value, str):
+            return [value]
+    if not isinstance(value, list):
+        return []
+    return [str(v) for v in value if v is not None]
+
+
 # ── Embedding Text Builder ──
 
 
-def build_embedding_text(recipe: dict) -> str:
-    """Build a rich text string for embedding from a recipe dict."""
+def build_embedding_text(recipe: dict, ingredients_text: str | None = None) -> str:
+    """Build a rich text string for embedding from a recipe dict.
+
+    ``ingredients_text`` is the ", "-joined ingredient list, if the caller
+    has already built it.
+    """
     parts = []
 
     title = recipe.get("recipe_title", "")
@@ -278,10 +361,10 @@ def build_embedding_text(recipe: dict) -> str:
     if description:
         parts.append(description)
 
-    ingredients = recipe.get("ingredients", [])
-    if ingredients:
-        # Strip quantities, keep just the food item names for better matching
-        parts.append("Ingredients: " + ", ".join(ingredients))
+    if ingredients_text is None:
+        ingredients_text = ", ".join(recipe.get("ingredients", []))
+    if ingredients_text:
+        parts.append("Ingredients: " + ingredients_text)
 
     category = recipe.get("category", "")
     if category:
@@ -290,43 +373,232 @@ def build_embedding_text(recipe: dict) -> str:
     return ". ".join(parts)
 
 
-# ── Main Ingestion ──
+# ── Resume State ──
 
 
-def ingest(
-    data_path: str,
-    limit: int | None = None,
-    batch_size: int = 50,
-    embedding_batch_size: int = 100,
-) -> None:
-    """Ingest recipes from JSON file into Actian VectorAI DB."""
+def open_resume_db(path: str) -> sqlite3.Connection:
+    """Open (or create) the SQLite record of ids already upserted."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ingested ("
+        "collection TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (collection, id))"
+    )
+    return conn
+
+
+def load_ingested_ids(conn: sqlite3.Connection) -> set[int]:
+    rows = conn.execute(
+        "SELECT id FROM ingested WHERE collection = ?", (settings.COLLECTION_NAME,)
+    )
+    return {row[0] for row in rows}
+
+
+def record_ingested_ids(conn: sqlite3.Connection, ids: list[int]) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO ingested (collection, id) VALUES (?, ?)",
+        [(settings.COLLECTION_NAME, i) for i in ids],
+    )
+    conn.commit()
 
-    print(f"Reading recipes from {data_path}...")
 
-    # Read all recipes
-    recipes = []
-    with open(data_path, "r", encoding="utf-8") as f:
+# ── Main Ingestion ──
+
+
+def iter_recipes(data_path: str) -> Iterator[dict]:
+    """Stream recipes from the NDJSON dataset, one parsed dict per line."""
+    with open(data_path, "rb") as f:
         for line_num, line in enumerate(f):
             line = line.strip()
             if not line:
                 continue
             try:
-                recipe = json.loads(line)
-                recipes.append(recipe)
-            except json.JSONDecodeError as e:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
                 print(f"  Skipping line {line_num + 1}: {e}")
-                continue
 
-            if limit and len(recipes) >= limit:
-                break
 
-    total = len(recipes)
-    print(f"Loaded {total} recipes.")
+def iter_batches(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to ``size`` items."""
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def count_lines(data_path: str, limit: int | None = None) -> int:
+    """Count non-empty lines without parsing them (for progress output).
+
+    Stops reading once ``limit`` lines have been seen.
+    """
+    with open(data_path, "rb") as f:
+        return sum(1 for _ in islice((line for line in f if line.strip()), limit or None))
+
+
+def prepare_recipe(recipe: dict) -> tuple[dict, str]:
+    """Build the Actian payload (with auto-inferred tags) and the embedding text.
+
+    The ingredient list is joined once and shared: lowercased for tag
+    inference, as-is for the embedding text.
+    """
+    # Store list fields as native lists so queries return them parsed
+    ingredients = as_str_list(recipe.get("ingredients", []))
+    directions = as_str_list(recipe.get("directions", []))
+    ingredients_text = ", ".join(ingredients)
+    num_steps = recipe.get("num_steps", 0)
+
+    payload = {
+        "title": recipe.get("recipe_title", ""),
+        "description": recipe.get("description", ""),
+        "ingredients": ingredients,
+        "directions": directions,
+        "category": recipe.get("category", ""),
+        "subcategory": recipe.get("subcategory", ""),
+        "num_ingredients": recipe.get("num_ingredients", len(ingredients)),
+        "num_steps": num_steps,
+        "skill_level": infer_skill_level(num_steps),
+        **infer_dietary_tags(ingredients_text.lower()),
+    }
+    return payload, build_embedding_text(recipe, ingredients_text)
+
+
+# Ids are sent to the frontend, where they must stay exact JavaScript numbers
+_JS_SAFE_ID_MASK = (1 << 53) - 1
+
+
+def content_id(payload: dict) -> int:
+    """Stable id derived from a recipe's title and ingredients.
+
+    Unlike positional ids it doesn't shift when the dataset is edited or
+    reordered, so re-runs overwrite the same points, and exact duplicate
+    recipes collapse into one.
+    """
+    key = "\0".join([payload["title"] or "", *payload["ingredients"]]).encode()
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") & _JS_SAFE_ID_MASK
+
+
+def prepare_chunk(
+    chunk: list[tuple[int, dict]],
+    content_ids: bool = False,
+) -> tuple[list[int], list[dict], list[str]]:
+    """Ids, payloads and embedding texts for a chunk of (position, recipe)."""
+    prepared = [prepare_recipe(recipe) for _, recipe in chunk]
+    payloads = [payload for payload, _ in prepared]
+    texts = [text for _, text in prepared]
+    if content_ids:
+        ids = [content_id(payload) for payload in payloads]
+    else:
+        ids = [i for i, _ in chunk]
+    return ids, payloads, texts
+
+
+def embed_texts(texts: list[str], embedding_batch_size: int) -> np.ndarray:
+    """Embed texts with the local model in chunks of ``embedding_batch_size``.
+
+    The model runs in-process, so there is no rate limit to sleep around.
+    Returns one float32 row per text; upsert batches are slices (views) of it.
+    """
+    return np.concatenate(
+        [
+            gemini.generate_embeddings_batch(chunk)
+            for chunk in iter_batches(texts, embedding_batch_size)
+        ]
+    )
+
+
+def upsert_batch(ids: list[int], vectors: np.ndarray, payloads: list[dict]) -> list[int]:
+    """Batch upsert on a pooled client, falling back to one-by-one upserts.
+
+    Returns the ids that were written.
+    """
+    with vector_db.borrow_client() as client:
+        try:
+            vector_db.batch_upsert_recipes(client, ids, vectors, payloads)
+            return ids
+        except Exception as e:
+            print(f"\n  Error upserting batch: {e}")
+            # Try individual upserts as fallback
+            written = []
+            for rid, vec, pay in zip(ids, vectors, payloads):
+                try:
+                    vector_db.upsert_recipe(client, rid, vec, pay)
+                    written.append(rid)
+                except Exception as e2:
+                    print(f"    Failed recipe {rid}: {e2}")
+            return written
+
+
+SWEEP_BATCH_SIZES = (16, 32, 64, 128, 256, 512)
+
+
+def sweep_batch_size(
+    data_path: str,
+    candidates: tuple[int, ...] = SWEEP_BATCH_SIZES,
+    probe_size: int = 1024,
+    content_ids: bool = False,
+) -> int:
+    """Time upserts of the first ``probe_size`` recipes at each batch size.
+
+    Runs on one connection so the numbers reflect per-batch cost, and
+    returns the fastest size. The probe recipes are written with their
+    real ids, so the ingest that follows simply overwrites them.
+    """
+    probe = list(islice(enumerate(iter_recipes(data_path)), probe_size))
+    if not probe:
+        return candidates[0]
+    ids, payloads, texts = prepare_chunk(probe, content_ids)
+    vectors = embed_texts(texts, 128)
+
+    print(f"Sweeping upsert batch sizes on {len(ids)} recipes...")
+    rates = {}
+    for size in candidates:
+        t0 = time.perf_counter()
+        for start in range(0, len(ids), size):
+            end = start + size
+            upsert_batch(ids[start:end], vectors[start:end], payloads[start:end])
+        rates[size] = len(ids) / (time.perf_counter() - t0)
+        print(f"  batch_size={size:<4d} {rates[size]:8.0f} recipes/s")
+
+    best = max(rates, key=rates.get)
+    print(f"Fastest batch size: {best}")
+    return best
+
+
+def ingest(
+    data_path: str,
+    limit: int | None = None,
+    batch_size: int = 50,
+    embedding_batch_size: int = 100,
+    concurrency: int = 4,
+    sweep: bool = False,
+    content_ids: bool = False,
+    resume_db: str | None = None,
+) -> None:
+    """Ingest recipes from JSON file into Actian VectorAI DB.
+
+    Recipes are streamed from disk, so only a couple of chunks of recipes,
+    payloads and vectors are in memory at a time regardless of dataset size.
+    Up to ``concurrency`` upsert batches run at once, each on its own
+    pooled connection. With ``content_ids`` points are keyed by a hash of
+    title + ingredients instead of their position in the file.
+
+    With ``resume_db``, ids are recorded in that SQLite file as their upserts
+    succeed, and recipes already recorded are skipped before embedding, so
+    an interrupted run picks up where it stopped. Rerun with the same data
+    file and id scheme.
+    """
+
+    print(f"Reading recipes from {data_path}...")
+    total = count_lines(data_path, limit)
+    print(f"Found {total} recipes.")
+
+    resume = open_resume_db(resume_db) if resume_db else None
+    done = load_ingested_ids(resume) if resume else set()
+    if done:
+        print(f"Resuming: {len(done)} recipes already ingested will be skipped.")
 
     # Connect to Actian DB
     print(f"Connecting to Actian VectorAI DB at {settings.ACTIAN_DB_ADDRESS}...")
-    client = vector_db.get_client()
-    client.connect()
+    vector_db.open_pool(size=concurrency)
 
     try:
         # Ensure collection exists
@@ -334,111 +606,91 @@ def ingest(
             f"Ensuring collection '{settings.COLLECTION_NAME}' exists "
             f"(dim={settings.EMBEDDING_DIMENSION})..."
         )
-        vector_db.ensure_collection(client)
+        with vector_db.borrow_client() as client:
+            vector_db.ensure_collection(client)
 
-        # Process in batches
-        processed = 0
-        batch_ids = []
-        batch_vectors = []
-        batch_payloads = []
-
-        # Accumulate texts for embedding batches
-        embedding_texts = []
-        embedding_indices = []  # Track which recipe index each text belongs to
+        if sweep:
+            # Never probe past --limit: the probe writes to the real collection
+            probe_size = min(1024, limit) if limit else 1024
+            batch_size = sweep_batch_size(
+                data_path, probe_size=probe_size, content_ids=content_ids,
+            )
 
         print(
             f"\nStarting ingestion (batch_size={batch_size}, "
-            f"embedding_batch={embedding_batch_size})...\n"
+            f"embedding_batch={embedding_batch_size}, concurrency={concurrency})...\n"
         )
 
-        for i, recipe in enumerate(recipes):
-            # Build payload with auto-inferred tags
-            ingredients = recipe.get("ingredients", [])
-            num_steps = recipe.get("num_steps", 0)
-
-            tag_info = infer_dietary_tags(ingredients)
-            skill = infer_skill_level(num_steps)
-
-            payload = {
-                "title": recipe.get("recipe_title", ""),
-                "description": recipe.get("description", ""),
-                "ingredients": ingredients,
-                "directions": recipe.get("directions", []),
-                "category": recipe.get("category", ""),
-                "subcategory": recipe.get("subcategory", ""),
-                "num_ingredients": recipe.get("num_ingredients", len(ingredients)),
-                "num_steps": num_steps,
-                "skill_level": skill,
-                **tag_info,
-            }
-
-            # Build text for embedding
-            embed_text = build_embedding_text(recipe)
-            embedding_texts.append(embed_text)
-            embedding_indices.append(i)
-
-            batch_ids.append(i)
-            batch_payloads.append(payload)
-
-            # When we have enough texts, generate embeddings in batch
-            if len(embedding_texts) >= embedding_batch_size or i == total - 1:
-                # Generate embeddings
-                try:
-                    vectors = gemini.generate_embeddings_batch(embedding_texts)
-                except Exception as e:
-                    # Rate limit handling: wait and retry
-                    print(f"\n  Rate limited, waiting 60s... ({e})")
-                    time.sleep(60)
-                    vectors = gemini.generate_embeddings_batch(embedding_texts)
-
-                batch_vectors.extend(vectors)
-                embedding_texts = []
-                embedding_indices = []
-
-                # Small delay to respect rate limits
-                time.sleep(0.5)
-
-            # When batch is full, upsert to DB
-            if len(batch_ids) >= batch_size or i == total - 1:
-                if batch_ids and len(batch_vectors) >= len(batch_ids):
-                    # Take only the vectors for this batch
-                    current_vectors = batch_vectors[: len(batch_ids)]
-                    batch_vectors = batch_vectors[len(batch_ids) :]
-
-                    try:
-                        vector_db.batch_upsert_recipes(
-                            client, batch_ids, current_vectors, batch_payloads
-                        )
-                    except Exception as e:
-                        print(f"\n  Error upserting batch: {e}")
-                        # Try individual upserts as fallback
-                        for j, (rid, vec, pay) in enumerate(
-                            zip(batch_ids, current_vectors, batch_payloads)
-                        ):
-                            try:
-                                vector_db.upsert_recipe(client, rid, vec, pay)
-                            except Exception as e2:
-                                print(f"    Failed recipe {rid}: {e2}")
-
-                    processed += len(batch_ids)
-                    pct = (processed / total) * 100
-                    print(
-                        f"  Progress: {processed}/{total} ({pct:.1f}%) "
-                        f"- Last: {batch_payloads[-1]['title'][:50]}",
-                        end="\r",
+        # Positions among the successfully parsed recipes (the default ids)
+        recipes = enumerate(islice(iter_recipes(data_path), limit or None))
+        # Big enough to give every upsert worker a batch
+        chunk_size = max(batch_size * concurrency, embedding_batch_size)
+        processed = 0
+        skipped = 0
+
+        with (
+            ThreadPoolExecutor(max_workers=1) as embed_pool,
+            ThreadPoolExecutor(max_workers=concurrency) as upsert_pool,
+        ):
+
+            def flush(ids, payloads, vectors_future) -> None:
+                nonlocal processed
+                vectors = vectors_future.result()
+                upserts = [
+                    upsert_pool.submit(
+                        upsert_batch,
+                        ids[start : start + batch_size],
+                        vectors[start : start + batch_size],
+                        payloads[start : start + batch_size],
                     )
-
-                    batch_ids = []
-                    batch_payloads = []
+                    for start in range(0, len(ids), batch_size)
+                ]
+                for upsert in upserts:
+                    written = upsert.result()
+                    if resume:
+                        record_ingested_ids(resume, written)
+
+                processed += len(ids)
+                pct = ((processed + skipped) / max(total, 1)) * 100
+                print(
+                    f"  Progress: {processed + skipped}/{total} ({pct:.1f}%) "
+                    f"- Last: {payloads[-1]['title'][:50]}",
+                    end="\r",
+                )
+
+            # Embed the next chunk on a worker thread while the current one
+            # is upserted, so the model and the DB round-trips overlap.
+            pending = None
+            for chunk in iter_batches(recipes, chunk_size):
+                ids, payloads, texts = prepare_chunk(chunk, content_ids)
+                if done:
+                    keep = [j for j, rid in enumerate(ids) if rid not in done]
+                    skipped += len(ids) - len(keep)
+                    if not keep:
+                        continue
+                    ids = [ids[j] for j in keep]
+                    payloads = [payloads[j] for j in keep]
+                    texts = [texts[j] for j in keep]
+                future = embed_pool.submit(embed_texts, texts, embedding_batch_size)
+                if pending:
+                    flush(*pending)
+                pending = (ids, payloads, future)
+            if pending:
+                flush(*pending)
 
         print(f"\n\nIngestion complete! {processed} recipes inserted.")
+        if skipped:
+            print(f"Skipped {skipped} recipes ingested by a previous run.")
 
         # Verify
-        count = vector_db.get_collection_count(client)
+        with vector_db.borrow_client() as client:
+            count = vector_db.get_collection_count(client)
         print(f"Collection '{settings.COLLECTION_NAME}' now has {count} vectors.")
 
     finally:
-        client.close()
+        vector_db.close_pool()
+        if resume:
+            resume.close()
 
 
 if __name__ == "__main__":
@@ -469,7 +721,33 @@ if __name__ == "__main__":
         "--embedding-batch-size",
         type=int,
         default=100,
-        help="Number of texts per embedding API call (default: 100)",
+        help="Number of texts per embedding model call (default: 100)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Upsert batches in flight, one DB connection each (default: 4)",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Time upserts at several batch sizes first and ingest with the fastest",
+    )
+    parser.add_argument(
+        "--content-ids",
+        action="store_true",
+        help="Key recipes by a hash of title + ingredients instead of file position "
+        "(don't mix with an existing positional-id collection)",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="ingested.db",
+        default=None,
+        metavar="STATE_DB",
+        help="Record upserted ids in a SQLite file (default: ingested.db) and "
+        "skip them on the next run",
     )
 
     args = parser.parse_args()
@@ -478,4 +756,8 @@ if __name__ == "__main__":
         limit=args.limit,
         batch_size=args.batch_size,
         embedding_batch_size=args.embedding_batch_size,
+        concurrency=max(args.concurrency, 1),
+        sweep=args.sweep,
+        content_ids=args.content_ids,
+        resume_db=args.resume,
     )
\ No newline at end of file
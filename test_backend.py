@@ -2,6 +2,9 @@
 import requests
 import json
 
+# Reused across calls so repeated scans keep one keep-alive connection
+SESSION = requests.Session()
+
 def test_scan():
     url = "http://localhost:8000/api/scan"
     
@@ -16,7 +19,7 @@ def test_scan():
     }
     
     try:
-        response = requests.post(url, files=files, data=data)
+        response = SESSION.post(url, files=files, data=data)
         print(f"Status Code: {response.status_code}")
         print(f"Response Body: {response.text}")
     except Exception as e: